@@ -0,0 +1,25 @@
+# clients.py
+from __future__ import annotations
+from functools import lru_cache
+from typing import TYPE_CHECKING
+
+from config import Settings
+
+if TYPE_CHECKING:
+    from openai import OpenAI
+    from qdrant_client import QdrantClient
+
+
+@lru_cache(maxsize=None)
+def get_openai(s: Settings) -> "OpenAI":
+    """Ein OpenAI-Client pro Settings-Instanz; Import erst beim ersten Aufruf."""
+    from openai import OpenAI
+    return OpenAI(api_key=s.openai_api_key)
+
+
+@lru_cache(maxsize=None)
+def get_qdrant(s: Settings) -> "QdrantClient":
+    """Ein Qdrant-Client (gRPC) pro Settings-Instanz; wird über alle Schritte geteilt."""
+    from qdrant_client import QdrantClient
+    # gRPC verwenden, weil Ziel 'docker:6334' ist
+    return QdrantClient(host=s.qdrant_host, grpc_port=s.qdrant_grpc_port, prefer_grpc=True)
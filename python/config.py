@@ -27,4 +27,18 @@ class Settings:
     mmr_lambda: float = float(os.environ.get("RAG_MMR_LAMBDA", "0.5"))
     doc_filter: str = os.environ.get("RAG_DOC_FILTER", "").strip()
     stream: bool = os.environ.get("RAG_STREAM", "false").lower() in {"1","true","yes"}
+    hnsw_ef: int = int(os.environ.get("RAG_HNSW_EF", "0"))  # 0 = Qdrant-Standard
+    # Partitionierung (siehe partitions.py)
+    partition_mode: str = os.environ.get("RAG_PARTITION_MODE", "none").strip().lower()
+    partitions: str = os.environ.get("RAG_PARTITIONS", "").strip()
+    # Latenz-Modus: Warm-up beim Start, Streaming, Stufenzeiten + TTFT je Frage
+    fast_path: bool = os.environ.get("RAG_FAST_PATH", "false").lower() in {"1","true","yes"}
+    ttft_target_ms: int = int(os.environ.get("RAG_TTFT_TARGET_MS", "0"))  # 0 = kein Ziel
 
+    # CLI-Daemon (rag_cli.py serve / ask)
+    daemon_host: str = os.environ.get("RAG_DAEMON_HOST", "127.0.0.1")
+    daemon_port: int = int(os.environ.get("RAG_DAEMON_PORT", "8765"))
+    daemon_authkey: str = os.environ.get("RAG_DAEMON_KEY", "")  # leer -> Schlüsseldatei
+    daemon_key_file: str = os.path.expanduser(os.environ.get("RAG_DAEMON_KEY_FILE", "~/.rag_daemon.key"))
+    daemon_connect_timeout: float = float(os.environ.get("RAG_DAEMON_CONNECT_TIMEOUT", "3"))
+    daemon_reply_timeout: float = float(os.environ.get("RAG_DAEMON_REPLY_TIMEOUT", "120"))
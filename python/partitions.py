@@ -0,0 +1,86 @@
+# partitions.py
+"""
+Partitionierung der Dokumente nach Gruppen/Mandanten.
+
+RAG_PARTITIONS ordnet Dokumente Partitionen zu, z. B.
+    RAG_PARTITIONS="finanzen=Businessplan SmartPlanAI,Azure Kostenkalkulation SmartPlanAI;technik=Architektur"
+Nicht aufgeführte Dokumente landen in der Partition 'default'.
+
+RAG_PARTITION_MODE:
+- none:       eine Collection, keine Partitionen (bisheriges Verhalten)
+- shard:      eine Collection mit benutzerdefinierten Shard-Keys (Qdrant im Cluster-Modus)
+- collection: eine eigene Collection je Partition: '<RAG_COLLECTION_NAME>__<partition>'
+"""
+from __future__ import annotations
+import re
+from typing import Dict, List, Tuple
+
+from config import Settings
+
+DEFAULT_PARTITION = "default"
+MODES = {"none", "shard", "collection"}
+# Partitionsnamen landen unverändert in Collection-Namen bzw. Shard-Keys
+PARTITION_NAME = re.compile(r"[A-Za-z0-9_-]+")
+
+
+def parse_partition_map(raw: str) -> Dict[str, str]:
+    """'p1=docA,docB;p2=docC' -> {'docA': 'p1', 'docB': 'p1', 'docC': 'p2'}"""
+    mapping: Dict[str, str] = {}
+    for group in raw.split(";"):
+        if not group.strip():
+            continue
+        name, sep, docs = group.partition("=")
+        name = name.strip()
+        if not sep or not name:
+            raise SystemExit(f"RAG_PARTITIONS: ungültiger Eintrag '{group.strip()}' (erwartet 'name=dok1,dok2').")
+        if not PARTITION_NAME.fullmatch(name):
+            raise SystemExit(f"RAG_PARTITIONS: Partitionsname '{name}' ungültig (erlaubt: A-Z, a-z, 0-9, _ und -).")
+        for doc in docs.split(","):
+            doc = doc.strip()
+            if doc:
+                mapping[doc] = name
+    return mapping
+
+def partition_mode(s: Settings) -> str:
+    mode = s.partition_mode or "none"
+    if mode not in MODES:
+        raise SystemExit(f"RAG_PARTITION_MODE '{mode}' unbekannt (erlaubt: {', '.join(sorted(MODES))}).")
+    return mode
+
+def partition_of(mapping: Dict[str, str], document_id: str) -> str:
+    """mapping aus parse_partition_map (einmal parsen, für viele Dokumente nutzen)."""
+    return mapping.get(document_id, DEFAULT_PARTITION)
+
+def all_partitions(s: Settings) -> List[str]:
+    names = set(parse_partition_map(s.partitions).values())
+    names.add(DEFAULT_PARTITION)
+    return sorted(names)
+
+def partitions_for_docs(s: Settings, doc_whitelist: List[str] | None) -> List[str]:
+    """Nur die Partitionen, in denen die gefilterten Dokumente liegen (ohne Filter: alle)."""
+    if not doc_whitelist:
+        return all_partitions(s)
+    mapping = parse_partition_map(s.partitions)
+    return sorted({mapping.get(d, DEFAULT_PARTITION) for d in doc_whitelist})
+
+def partition_collection(s: Settings, partition: str) -> str:
+    # Namen sind in parse_partition_map geprüft -> eindeutig, ohne Umschreiben
+    return f"{s.collection}__{partition}"
+
+def storage_collections(s: Settings) -> List[str]:
+    """Alle physischen Collections, die zur Konfiguration gehören."""
+    if partition_mode(s) == "collection":
+        return [partition_collection(s, p) for p in all_partitions(s)]
+    return [s.collection]
+
+def route(s: Settings, partitions: List[str]) -> List[Tuple[str, List[str] | None]]:
+    """
+    Ziele für Upsert/Suche als (collection, shard_keys).
+    shard_keys ist nur im Modus 'shard' gesetzt, sonst None.
+    """
+    mode = partition_mode(s)
+    if mode == "shard":
+        return [(s.collection, partitions)]
+    if mode == "collection":
+        return [(partition_collection(s, p), None) for p in partitions]
+    return [(s.collection, None)]
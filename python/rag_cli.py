@@ -0,0 +1,405 @@
+# rag_cli.py
+"""
+Gemeinsamer Einstiegspunkt für alle Schritte:
+
+    python rag_cli.py setup | chunk | embed | upsert
+    python rag_cli.py ask ["Frage"]      # ohne Frage: interaktiver Chat (wie step05)
+    python rag_cli.py ask --fast [...]   # Latenz-Modus: Warm-up, Streaming, TTFT/Stufenzeiten
+    python rag_cli.py tune golden.jsonl  # Retrieval-Parameter abstimmen (step06)
+    python rag_cli.py serve              # Warm-Daemon: Clients + Tokenizer bleiben geladen
+    python rag_cli.py importtime         # Importzeiten messen
+
+Schwere Pakete (openai, qdrant_client, numpy, tiktoken, pypdf) werden erst im
+jeweiligen Unterbefehl geladen. Ein 'ask' mit Frage fragt zuerst einen laufenden
+Daemon an und fällt sonst auf die lokale Ausführung zurück.
+"""
+from __future__ import annotations
+import argparse
+import json
+import os
+import subprocess
+import sys
+from dataclasses import replace
+
+from config import Settings
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+
+# Ziele für 'importtime': Name -> Python-Code, dessen Laufzeit gemessen wird
+IMPORT_TARGETS = {
+    "rag_cli": "import rag_cli",
+    "config": "import config",
+    "step05_chatbot": "import step05_chatbot",
+    "openai": "import openai",
+    "qdrant_client": "import qdrant_client",
+    "numpy": "import numpy",
+    "tiktoken": "import tiktoken",
+    "pypdf": "import pypdf",
+    "encoder(cl100k_base)": "from step02_pdf_chunking import get_encoder; get_encoder()",
+}
+
+
+# ---------- Pipeline-Schritte ----------
+
+def cmd_setup(args: argparse.Namespace) -> int:
+    from step01_qdrant_setup import main
+    main()
+    return 0
+
+def cmd_chunk(args: argparse.Namespace) -> int:
+    from step02_pdf_chunking import main
+    main()
+    return 0
+
+def cmd_embed(args: argparse.Namespace) -> int:
+    from step03_embeddings import main
+    main()
+    return 0
+
+def cmd_upsert(args: argparse.Namespace) -> int:
+    from step04_upsert_qdrant import main
+    main()
+    return 0
+
+def cmd_tune(argv: list[str]) -> int:
+    from step06_tuning import main
+    main(argv)
+    return 0
+
+
+# ---------- Chat / Daemon ----------
+
+# Felder, die der Daemon nicht vom Aufrufer übernimmt: Geheimnisse/Daemon-Konfiguration
+# sowie Client-Verbindungsdaten (stattdessen per Fingerprint verglichen).
+DAEMON_LOCAL_FIELDS = {
+    "openai_api_key", "qdrant_host", "qdrant_grpc_port",
+    "daemon_host", "daemon_port", "daemon_authkey", "daemon_key_file",
+    "daemon_connect_timeout", "daemon_reply_timeout",
+}
+
+def daemon_key(s: Settings, create: bool = False) -> bytes | None:
+    """
+    Schlüssel für den Daemon: RAG_DAEMON_KEY oder Schlüsseldatei (0600).
+    Mit create=True (nur 'serve') wird die Datei bei Bedarf neu erzeugt.
+    """
+    if s.daemon_authkey:
+        return s.daemon_authkey.encode()
+    path = s.daemon_key_file
+    try:
+        with open(path, "rb") as f:
+            private = key_file_is_private(f.fileno())
+            key = f.read().strip()
+        if key:
+            if not private:
+                msg = f"Schlüsseldatei {path} ist für Gruppe/andere zugänglich – bitte 'chmod 600 {path}' (oder Schlüssel neu erzeugen)."
+                if create:
+                    raise SystemExit(msg)
+                print(f"[Daemon] {msg} Führe lokal aus.", file=sys.stderr)
+                return None
+            return key
+    except FileNotFoundError:
+        pass
+    if not create:
+        return None
+    import secrets
+    key = secrets.token_hex(32).encode()
+    fd = os.open(path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+    # der Modus von os.open gilt nur für neue Dateien -> bestehende (leere) Datei nachziehen
+    if hasattr(os, "fchmod"):
+        os.fchmod(fd, 0o600)
+    with os.fdopen(fd, "wb") as f:
+        f.write(key)
+    print(f"Daemon-Schlüssel erzeugt: {path}")
+    return key
+
+def key_file_is_private(fd: int) -> bool:
+    """Keine Rechte für Gruppe/andere (unter Windows ohne POSIX-Rechte nicht prüfbar)."""
+    if os.name == "nt":
+        return True
+    return not os.fstat(fd).st_mode & 0o077
+
+def client_fingerprint(s: Settings) -> str:
+    """Identität der Clients (API-Key, Qdrant-Ziel), ohne den Key selbst zu übertragen."""
+    import hashlib
+    raw = f"{s.openai_api_key}|{s.qdrant_host}|{s.qdrant_grpc_port}"
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+def request_settings(s: Settings) -> dict:
+    from dataclasses import asdict
+    return {k: v for k, v in asdict(s).items() if k not in DAEMON_LOCAL_FIELDS}
+
+def send_json(conn, obj: dict) -> None:
+    # JSON statt Pickle: recv() würde beliebige Objekte entpacken
+    conn.send_bytes(json.dumps(obj, ensure_ascii=False).encode("utf-8"))
+
+def recv_json(conn, timeout: float) -> dict:
+    if not conn.poll(timeout):
+        raise TimeoutError(f"keine Antwort innerhalb von {timeout:.0f}s")
+    return json.loads(conn.recv_bytes().decode("utf-8"))
+
+def connect_daemon(s: Settings):
+    """
+    Verbindung inkl. Authentifizierung mit Timeout. Liefert None, wenn kein
+    Daemon erreichbar ist, der Schlüssel nicht passt oder ein fremder Dienst antwortet.
+    """
+    import threading
+    from multiprocessing import AuthenticationError
+    from multiprocessing.connection import Client
+
+    key = daemon_key(s)
+    if key is None:
+        return None
+    result: dict = {}
+
+    def run() -> None:
+        try:
+            result["conn"] = Client((s.daemon_host, s.daemon_port), authkey=key)
+        except (OSError, EOFError, AuthenticationError) as e:
+            result["error"] = e
+
+    # Der Handshake von multiprocessing kennt keinen Timeout -> in einem Thread abwarten
+    t = threading.Thread(target=run, daemon=True)
+    t.start()
+    t.join(s.daemon_connect_timeout)
+    if t.is_alive():
+        print("Daemon antwortet nicht (Timeout) – lokale Ausführung.", file=sys.stderr)
+        return None
+    err = result.get("error")
+    if isinstance(err, AuthenticationError):
+        print("Daemon-Authentifizierung fehlgeschlagen – lokale Ausführung.", file=sys.stderr)
+    return result.get("conn")
+
+def ask_daemon(s: Settings, question: str) -> str | None:
+    """
+    Schickt die Frage samt Einstellungen an einen laufenden Daemon. Liefert die
+    Antwort oder None, wenn der Daemon nicht nutzbar ist (dann lokal ausführen).
+    """
+    conn = connect_daemon(s)
+    if conn is None:
+        return None
+    try:
+        with conn:
+            send_json(conn, {
+                "cmd": "ask",
+                "question": question,
+                "settings": request_settings(s),
+                "fingerprint": client_fingerprint(s),
+            })
+            reply = recv_json(conn, s.daemon_reply_timeout)
+    except (OSError, EOFError, TimeoutError, ValueError) as e:
+        print(f"Daemon-Anfrage fehlgeschlagen ({e}) – lokale Ausführung.", file=sys.stderr)
+        return None
+    if reply.get("fallback"):
+        print(f"Daemon nicht passend ({reply.get('error')}) – lokale Ausführung.", file=sys.stderr)
+        return None
+    if not reply.get("ok"):
+        raise SystemExit(f"Daemon-Fehler: {reply.get('error')}")
+    return reply["answer"]
+
+def ask_local(s: Settings, question: str) -> str:
+    from clients import get_openai, get_qdrant
+    from step05_chatbot import answer_question
+    answer = answer_question(get_openai(s), get_qdrant(s), s, question)
+    # mit RAG_STREAM=true ist die Antwort schon ausgegeben, answer enthält nur noch die Quellen
+    return "Keine passenden Stellen im Material gefunden." if answer is None else answer
+
+def ask_fast(s: Settings, question: str) -> int:
+    """One-Shot im Latenz-Modus: Qdrant-/Tokenizer-Warm-up parallel zum Embedding, Stream, Zeiten auf stderr."""
+    from clients import get_openai, get_qdrant
+    from step05_chatbot import Warmup, answer_question, format_timings
+
+    s = replace(s, stream=True)
+    oa, qc = get_openai(s), get_qdrant(s)
+    timings: dict[str, float] = {}
+    # OpenAI nicht vorwärmen: das Embedding startet sofort und öffnet die Verbindung selbst
+    warm = Warmup(oa, qc, s, warm_openai=False)
+    answer = answer_question(oa, qc, s, question, timings=timings, warm=warm)
+    if answer is None:
+        print("Keine passenden Stellen im Material gefunden.")
+    elif answer:
+        print("\n" + answer)  # Antwort kam bereits als Stream, hier nur die Quellen
+    print(format_timings(timings), file=sys.stderr)
+
+    ttft = timings.get("ttft_ms")
+    if ttft is None:
+        # keine Treffer -> nichts gestreamt, TTFT nicht messbar (kein Latenzfehler)
+        if s.ttft_target_ms:
+            print("[Zeiten] keine Treffer – TTFT nicht gemessen", file=sys.stderr)
+        return 0
+    if s.ttft_target_ms and ttft > s.ttft_target_ms:
+        print(f"[Zeiten] TTFT über Ziel ({s.ttft_target_ms} ms)", file=sys.stderr)
+        return 1
+    return 0
+
+def cmd_ask(args: argparse.Namespace) -> int:
+    question = " ".join(args.question).strip()
+    s = Settings()
+    if args.fast:
+        s = replace(s, fast_path=True)
+    if args.max_ttft_ms is not None:
+        s = replace(s, ttft_target_ms=args.max_ttft_ms)
+
+    if not question:
+        from step05_chatbot import main
+        main(s)
+        return 0
+
+    # Der Daemon antwortet ohne Streaming -> im Latenz-Modus immer lokal
+    if s.fast_path:
+        return ask_fast(s, question)
+
+    answer = None if args.no_daemon else ask_daemon(s, question)
+    if answer is None:
+        answer = ask_local(s, question)
+    print(answer)
+    return 0
+
+def cmd_serve(args: argparse.Namespace) -> int:
+    import ipaddress
+    from multiprocessing.connection import Listener
+    from clients import get_openai, get_qdrant
+    from step02_pdf_chunking import get_encoder
+    from step05_chatbot import answer_question
+    import numpy  # noqa: F401  (vorladen für MMR)
+
+    # Antworten gehen über die Verbindung zurück, nicht auf die Daemon-Konsole
+    base = replace(Settings(), stream=False, fast_path=False)
+    key = daemon_key(base, create=True)
+    fingerprint = client_fingerprint(base)
+    oa, qc = get_openai(base), get_qdrant(base)
+    get_encoder()
+    qc.collection_exists(base.collection)  # gRPC-Verbindung aufbauen
+
+    address = (base.daemon_host, base.daemon_port)
+    try:
+        if not ipaddress.ip_address(address[0]).is_loopback:
+            print(f"Warnung: Daemon ist außerhalb von localhost erreichbar ({address[0]}).", file=sys.stderr)
+    except ValueError:
+        pass  # Hostname statt IP
+    print(f"RAG-Daemon lauscht auf {address[0]}:{address[1]} (Strg+C beendet).")
+    with Listener(address, authkey=key) as listener:
+        while True:
+            try:
+                conn = listener.accept()
+            except KeyboardInterrupt:
+                print("\nDaemon beendet.")
+                return 0
+            except Exception as e:
+                # z. B. falscher authkey – Daemon läuft weiter
+                print(f"Verbindung abgelehnt: {e}", file=sys.stderr)
+                continue
+            with conn:
+                try:
+                    msg = recv_json(conn, base.daemon_connect_timeout)
+                    if msg.get("cmd") == "stop":
+                        send_json(conn, {"ok": True})
+                        print("Daemon beendet (stop).")
+                        return 0
+                    if msg.get("fingerprint") != fingerprint:
+                        send_json(conn, {"ok": False, "fallback": True,
+                                         "error": "andere OpenAI-/Qdrant-Konfiguration"})
+                        continue
+                    # Einstellungen des Aufrufers (Filter, top_k, Collection, …) übernehmen
+                    overrides = msg.get("settings", {})
+                    unknown = set(overrides) - set(request_settings(base))
+                    if unknown:
+                        send_json(conn, {"ok": False, "fallback": True,
+                                         "error": f"unbekannte Einstellungen {sorted(unknown)}"})
+                        continue
+                    s = replace(base, **{**overrides, "stream": False, "fast_path": False})
+                    answer = answer_question(oa, qc, s, msg["question"])
+                    send_json(conn, {"ok": True, "answer": answer or "Keine passenden Stellen im Material gefunden."})
+                except Exception as e:
+                    print(f"Fehler bei Anfrage: {e}", file=sys.stderr)
+                    try:
+                        send_json(conn, {"ok": False, "error": str(e)})
+                    except OSError:
+                        pass
+
+def cmd_stop(args: argparse.Namespace) -> int:
+    s = Settings()
+    conn = connect_daemon(s)
+    if conn is None:
+        print("Kein Daemon erreichbar.")
+        return 1
+    try:
+        with conn:
+            send_json(conn, {"cmd": "stop"})
+            recv_json(conn, s.daemon_connect_timeout)
+    except (OSError, EOFError, TimeoutError, ValueError) as e:
+        print(f"Stop fehlgeschlagen: {e}")
+        return 1
+    print("Daemon gestoppt.")
+    return 0
+
+
+# ---------- Importzeiten ----------
+
+def measure_import(code: str, repeat: int) -> float | None:
+    """Misst die Laufzeit von `code` in frischen Interpretern (Minimum über repeat Läufe, in ms)."""
+    snippet = (
+        "import time; t = time.perf_counter()\n"
+        f"{code}\n"
+        "print((time.perf_counter() - t) * 1000)"
+    )
+    best = None
+    for _ in range(repeat):
+        proc = subprocess.run([sys.executable, "-c", snippet], cwd=HERE, capture_output=True, text=True)
+        if proc.returncode != 0:
+            return None
+        ms = float(proc.stdout.strip().splitlines()[-1])
+        best = ms if best is None else min(best, ms)
+    return best
+
+def cmd_importtime(args: argparse.Namespace) -> int:
+    names = args.targets or list(IMPORT_TARGETS)
+    print(f"Importzeiten (Minimum aus {args.repeat} Läufen, frischer Interpreter):")
+    for name in names:
+        code = IMPORT_TARGETS.get(name, f"import {name}")
+        ms = measure_import(code, args.repeat)
+        shown = "nicht installiert/Fehler" if ms is None else f"{ms:8.1f} ms"
+        print(f"  {name:<22} {shown}")
+    return 0
+
+
+# ---------- Argumente ----------
+
+def build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(
+        prog="rag_cli",
+        description="RAG-Pipeline: Setup, Indizierung und Chat.",
+        epilog="Parameter-Tuning: 'rag_cli.py tune --help' (Argumente wie step06_tuning.py).",
+    )
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    sub.add_parser("setup", help="Collection in Qdrant anlegen (Schritt 1)").set_defaults(func=cmd_setup)
+    sub.add_parser("chunk", help="PDFs chunken, Vorschau (Schritt 2)").set_defaults(func=cmd_chunk)
+    sub.add_parser("embed", help="Embeddings erzeugen, Vorschau (Schritt 3)").set_defaults(func=cmd_embed)
+    sub.add_parser("upsert", help="Chunks → Embeddings → Qdrant (Schritt 4)").set_defaults(func=cmd_upsert)
+
+    p_ask = sub.add_parser("ask", help="Frage stellen; ohne Frage interaktiver Chat (Schritt 5)")
+    p_ask.add_argument("question", nargs="*", help="Frage (leer = interaktiv)")
+    p_ask.add_argument("--no-daemon", action="store_true", help="Daemon ignorieren, lokal ausführen")
+    p_ask.add_argument("--fast", action="store_true", help="Latenz-Modus (wie RAG_FAST_PATH=true)")
+    p_ask.add_argument("--max-ttft-ms", type=int, help="TTFT-Ziel; One-Shot endet mit Code 1 bei Überschreitung")
+    p_ask.set_defaults(func=cmd_ask)
+
+    sub.add_parser("serve", help="Warm-Daemon starten").set_defaults(func=cmd_serve)
+    sub.add_parser("stop", help="Laufenden Daemon beenden").set_defaults(func=cmd_stop)
+
+    p_imp = sub.add_parser("importtime", help="Importzeiten der Module messen")
+    p_imp.add_argument("targets", nargs="*", help=f"Ziele (Standard: {', '.join(IMPORT_TARGETS)})")
+    p_imp.add_argument("--repeat", type=int, default=3, help="Läufe pro Ziel (Standard: 3)")
+    p_imp.set_defaults(func=cmd_importtime)
+    return parser
+
+def main(argv: list[str] | None = None) -> int:
+    argv = sys.argv[1:] if argv is None else argv
+    if argv[:1] == ["tune"]:
+        # alle weiteren Argumente (auch --help) gehören step06_tuning
+        return cmd_tune(argv[1:])
+    args = build_parser().parse_args(argv)
+    return args.func(args)
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,24 +1,84 @@
 # step01_qdrant_setup.py
-from qdrant_client import QdrantClient
-from qdrant_client.models import VectorParams, Distance
+from __future__ import annotations
+from typing import TYPE_CHECKING, List, Set
+
+from clients import get_qdrant
 from config import Settings
+from partitions import all_partitions, partition_mode, storage_collections
+
+if TYPE_CHECKING:
+    from qdrant_client import QdrantClient
+
+# Payload-Felder, nach denen gefiltert wird -> Keyword-Index für schnelle gefilterte HNSW-Suche
+INDEXED_FIELDS = ("document_id", "partition")
+
+def ensure_collection(client: QdrantClient, name: str, size: int, shard_keys: List[str] | None = None) -> None:
+    """
+    Legt die Collection an (falls nötig) und sorgt für Payload-Indizes.
+    Mit shard_keys wird benutzerdefiniertes Sharding verwendet und fehlende Keys werden angelegt.
+    """
+    from qdrant_client.models import VectorParams, Distance, ShardingMethod
 
-def ensure_collection(client: QdrantClient, name: str, size: int) -> None:
     if client.collection_exists(name):
-        print(f"Collection '{name}' existiert bereits – nichts zu tun.")
-        return
-    # In .NET: Distance.Dot -> hier Distance.DOT
-    client.create_collection(
-        collection_name=name,
-        vectors_config=VectorParams(size=size, distance=Distance.DOT),
-    )
-    print(f"Collection '{name}' angelegt (size={size}, distance=DOT).")
+        print(f"Collection '{name}' existiert bereits – prüfe Shard-Keys und Payload-Indizes.")
+        if shard_keys:
+            sharding = client.get_collection(name).config.params.sharding_method
+            if sharding != ShardingMethod.CUSTOM:
+                raise SystemExit(
+                    f"Collection '{name}' wurde ohne benutzerdefiniertes Sharding angelegt. "
+                    f"Für RAG_PARTITION_MODE=shard bitte die Collection löschen und Schritt 1 erneut ausführen."
+                )
+    else:
+        extra = {"sharding_method": ShardingMethod.CUSTOM} if shard_keys else {}
+        # In .NET: Distance.Dot -> hier Distance.DOT
+        client.create_collection(
+            collection_name=name,
+            vectors_config=VectorParams(size=size, distance=Distance.DOT),
+            **extra,
+        )
+        print(f"Collection '{name}' angelegt (size={size}, distance=DOT).")
+
+    if shard_keys:
+        present = existing_shard_keys(client, name)
+        for key in shard_keys:
+            if key not in present:
+                client.create_shard_key(collection_name=name, shard_key=key)
+                print(f"  Shard-Key '{key}' angelegt.")
+
+    ensure_payload_indexes(client, name)
+
+def existing_shard_keys(client: QdrantClient, name: str) -> Set[str]:
+    """Shard-Keys laut Cluster-Info der Collection (lokale und entfernte Shards)."""
+    if hasattr(client, "collection_cluster_info"):
+        info = client.collection_cluster_info(collection_name=name)
+    else:
+        # ältere Clients: nur über die REST-API verfügbar
+        info = client.http.distributed_api.collection_cluster_info(collection_name=name).result
+    shards = list(info.local_shards or []) + list(info.remote_shards or [])
+    return {str(sh.shard_key) for sh in shards if sh.shard_key is not None}
+
+def ensure_payload_indexes(client: QdrantClient, name: str) -> None:
+    from qdrant_client.models import PayloadSchemaType
+
+    # create_payload_index ist idempotent
+    for field in INDEXED_FIELDS:
+        client.create_payload_index(
+            collection_name=name,
+            field_name=field,
+            field_schema=PayloadSchemaType.KEYWORD,
+            wait=True,
+        )
+
+def ensure_storage(client: QdrantClient, s: Settings) -> None:
+    """Alle Collections/Shard-Keys gemäß RAG_PARTITION_MODE anlegen."""
+    shard_keys = all_partitions(s) if partition_mode(s) == "shard" else None
+    for name in storage_collections(s):
+        ensure_collection(client, name, s.vector_size, shard_keys=shard_keys)
 
 def main() -> None:
     s = Settings()
-    # gRPC verwenden, weil Ziel 'docker:6334' ist
-    client = QdrantClient(host=s.qdrant_host, grpc_port=s.qdrant_grpc_port, prefer_grpc=True)
-    ensure_collection(client, s.collection, s.vector_size)
+    client = get_qdrant(s)
+    ensure_storage(client, s)
 
 if __name__ == "__main__":
     main()
@@ -2,13 +2,17 @@
 import os
 import re
 from dataclasses import dataclass, asdict
+from functools import lru_cache
 from typing import Iterator, List
-from pypdf import PdfReader
-import tiktoken
 
 from config import Settings
 
-ENCODER = tiktoken.get_encoding("cl100k_base")  # kompatibel zu OpenAI-Embeddings
+
+@lru_cache(maxsize=1)
+def get_encoder():
+    """Tokenizer erst bei Bedarf laden (spart Startzeit); danach prozessweit wiederverwendet."""
+    import tiktoken
+    return tiktoken.get_encoding("cl100k_base")  # kompatibel zu OpenAI-Embeddings
 
 @dataclass
 class Chunk:
@@ -31,6 +35,7 @@ def find_pdfs(root_dir: str) -> List[str]:
 
 def extract_pages(path: str) -> List[str]:
     """Liest PDF-Seiten als Text (eine Liste: ein Eintrag pro Seite)."""
+    from pypdf import PdfReader
     reader = PdfReader(path)
     pages = []
     for p in reader.pages:
@@ -52,11 +57,12 @@ def normalize_text(text: str) -> str:
 
 def chunk_text_by_tokens(text: str, max_tokens: int, overlap: int) -> Iterator[str]:
     """Chunking über Token-Fenster mit Überlappung; gibt dekodierten Text je Chunk zurück."""
-    tokens = ENCODER.encode(text)
+    enc = get_encoder()
+    tokens = enc.encode(text)
     step = max(1, max_tokens - overlap)
     for start in range(0, len(tokens), step):
         end = min(start + max_tokens, len(tokens))
-        yield ENCODER.decode(tokens[start:end])
+        yield enc.decode(tokens[start:end])
         if end == len(tokens):
             break
 
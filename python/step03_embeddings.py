@@ -1,13 +1,15 @@
 # step03_embeddings.py
 from __future__ import annotations
 import time
-from typing import List, Dict, Any, Iterable
-import numpy as np
-from openai import OpenAI
+from typing import TYPE_CHECKING, List, Dict, Any, Iterable
+from clients import get_openai
 from config import Settings
 # Wir nutzen die Chunks aus Schritt 2 erneut:
 from step02_pdf_chunking import build_chunks_for_directory, Chunk
 
+if TYPE_CHECKING:
+    from openai import OpenAI
+
 
 def batched(iterable: Iterable[Any], n: int) -> Iterable[list[Any]]:
     batch = []
@@ -21,6 +23,7 @@ def batched(iterable: Iterable[Any], n: int) -> Iterable[list[Any]]:
 
 
 def l2_normalize(vec: List[float]) -> List[float]:
+    import numpy as np
     v = np.array(vec, dtype=np.float32)
     n = float(np.linalg.norm(v)) or 1.0
     return (v / n).tolist()
@@ -31,6 +34,7 @@ def embed_chunks(
     model: str,
     batch_size: int = 96,
     max_retries: int = 5,
+    client: OpenAI | None = None,
 ) -> List[Dict[str, Any]]:
     """
     Erzeugt Embeddings für alle Chunks und liefert
@@ -38,9 +42,10 @@ def embed_chunks(
     - id: z. B. "<document_id>#<chunk_index>"
     - vector: L2-normalisierter Vektor (für DOT-Ähnlichkeit)
     - payload: Metadaten (document_id, chunk_index, text, source_path, page_start, page_end)
+    Ohne expliziten client wird der geteilte Client aus clients.get_openai genutzt.
     """
     s = Settings()
-    client = OpenAI(api_key=s.openai_api_key)
+    client = client or get_openai(s)
 
     records: List[Dict[str, Any]] = []
     total = len(chunks)
@@ -91,6 +96,7 @@ def embed_chunks(
 
 
 def main():
+    import numpy as np
     s = Settings()
     # Chunks erneut erzeugen (einfachste Variante).
     chunks = build_chunks_for_directory(s)
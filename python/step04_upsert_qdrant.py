@@ -1,17 +1,20 @@
 # step04_upsert_qdrant.py
 from __future__ import annotations
 import uuid
-from typing import List, Dict, Any, Iterable
+from typing import TYPE_CHECKING, List, Dict, Any, Iterable
 
-from qdrant_client import QdrantClient
-from qdrant_client.models import PointStruct
+from clients import get_qdrant
 from config import Settings
+from partitions import parse_partition_map, partition_of, route, storage_collections
 
 # Aus Schritt 3 holen wir die Embedding-Erzeugung wieder rein
 from step03_embeddings import embed_chunks
 # Und aus Schritt 2 die Chunks
 from step02_pdf_chunking import build_chunks_for_directory
 
+if TYPE_CHECKING:
+    from qdrant_client import QdrantClient
+
 
 def batched(iterable: Iterable[Any], n: int) -> Iterable[list[Any]]:
     batch = []
@@ -25,6 +28,7 @@ def batched(iterable: Iterable[Any], n: int) -> Iterable[list[Any]]:
 
 
 def records_to_points(records):
+    from qdrant_client.models import PointStruct
     points = []
     for r in records:
         points.append(
@@ -37,10 +41,18 @@ def records_to_points(records):
     return points
 
 
-def upsert_records(client: QdrantClient, collection: str, records: List[Dict[str, Any]], batch_size: int = 256) -> int:
+def upsert_records(
+    client: QdrantClient,
+    collection: str,
+    records: List[Dict[str, Any]],
+    batch_size: int = 256,
+    shard_key: str | None = None,
+) -> int:
     """
     Schreibt die Records in Batches nach Qdrant. Liefert die Anzahl geschriebener Punkte zurück.
+    Mit shard_key landen die Punkte im entsprechenden Shard (benutzerdefiniertes Sharding).
     """
+    extra = {"shard_key_selector": shard_key} if shard_key else {}
     total = 0
     for batch in batched(records, batch_size):
         points = records_to_points(batch)
@@ -48,12 +60,33 @@ def upsert_records(client: QdrantClient, collection: str, records: List[Dict[str
             collection_name=collection,
             points=points,
             wait=True,           # bis Indexierung abgeschlossen ist
+            **extra,
         )
         total += len(points)
         print(f"Upsert: {total}/{len(records)} Punkte geschrieben …")
     return total
 
 
+def upsert_partitioned(client: QdrantClient, s: Settings, records: List[Dict[str, Any]], batch_size: int = 256) -> int:
+    """
+    Verteilt die Records gemäß RAG_PARTITION_MODE auf Shards/Collections.
+    Die Partition wird zusätzlich im Payload gespeichert.
+    """
+    mapping = parse_partition_map(s.partitions)
+    groups: Dict[str, List[Dict[str, Any]]] = {}
+    for r in records:
+        p = partition_of(mapping, r["payload"]["document_id"])
+        r["payload"]["partition"] = p
+        groups.setdefault(p, []).append(r)
+
+    total = 0
+    for p, group in sorted(groups.items()):
+        for collection, shard_keys in route(s, [p]):
+            print(f"Partition '{p}' → {collection}" + (f" (Shard {p})" if shard_keys else ""))
+            total += upsert_records(client, collection, group, batch_size, shard_key=p if shard_keys else None)
+    return total
+
+
 def main():
     s = Settings()
     # 1) Chunks (Schritt 2) laden/erzeugen
@@ -67,19 +100,21 @@ def main():
     records = embed_chunks(chunks, model=s.embedding_model, batch_size=96)
 
     # 3) Qdrant-Client (gRPC) verbinden
-    client = QdrantClient(host=s.qdrant_host, grpc_port=s.qdrant_grpc_port, prefer_grpc=True)
+    client = get_qdrant(s)
 
-    # Optional: prüfen, ob Collection existiert (sollte seit Schritt 1 der Fall sein)
-    if not client.collection_exists(s.collection):
-        raise SystemExit(f"Collection '{s.collection}' nicht gefunden. Bitte Schritt 1 ausführen.")
+    # Optional: prüfen, ob Collection(s) existieren (sollte seit Schritt 1 der Fall sein)
+    collections = storage_collections(s)
+    for name in collections:
+        if not client.collection_exists(name):
+            raise SystemExit(f"Collection '{name}' nicht gefunden. Bitte Schritt 1 ausführen.")
 
-    # 4) Upsert in Batches
-    written = upsert_records(client, s.collection, records, batch_size=256)
-    print(f"\nFertig. Insgesamt geschrieben: {written} Punkte in '{s.collection}'.")
+    # 4) Upsert in Batches (je Partition)
+    written = upsert_partitioned(client, s, records, batch_size=256)
+    print(f"\nFertig. Insgesamt geschrieben: {written} Punkte in {', '.join(repr(c) for c in collections)}.")
 
     # 5) Optional: Count anzeigen (falls Server das Feature unterstützt)
     try:
-        cnt = client.count(collection_name=s.collection, exact=True).count
+        cnt = sum(client.count(collection_name=name, exact=True).count for name in collections)
         print(f"Collection-Zähler (exakt): {cnt}")
     except Exception:
         pass
@@ -1,23 +1,26 @@
 # step05_chatbot.py
 from __future__ import annotations
 import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import replace
 from datetime import datetime
-import numpy as np
-import tiktoken
-from typing import List, Tuple
-from openai import OpenAI
-from qdrant_client import QdrantClient
-from qdrant_client.models import ScoredPoint
-from qdrant_client.models import ScoredPoint, Filter, FieldCondition, MatchValue
-
+from typing import TYPE_CHECKING, Callable, Dict, List, Tuple
 
+from clients import get_openai, get_qdrant
 from config import Settings
+from partitions import partitions_for_docs, route, storage_collections
+from step02_pdf_chunking import get_encoder  # gleicher Tokenizer wie beim Chunking
 from step03_embeddings import l2_normalize  # gleiche Normierung wie beim Index
 
-ENC = tiktoken.get_encoding("cl100k_base")
+if TYPE_CHECKING:
+    import numpy as np
+    from openai import OpenAI
+    from qdrant_client import QdrantClient
+    from qdrant_client.models import ScoredPoint, Filter, SearchParams
 
 def count_tokens(text: str) -> int:
-    return len(ENC.encode(text))
+    return len(get_encoder().encode(text))
 
 def trim_to_tokens(texts: List[str], max_tokens: int) -> Tuple[str, int]:
     """Fügt Texte nacheinander zusammen, bis max_tokens erreicht sind."""
@@ -76,66 +79,103 @@ def embed_query(client: OpenAI, model: str, text: str, dim: int) -> List[float]:
 
 def search_qdrant(qc: QdrantClient, s: Settings, query_vec: List[float]) -> List[ScoredPoint]:
     """
-    Query mit Filter & Vektoren (für MMR). Handhabt unterschiedliche Client-Signaturen.
+    Query mit Filter & Vektoren (für MMR). Bei Partitionierung werden nur die
+    Partitionen der gefilterten Dokumente abgefragt und die Treffer nach Score gemischt.
     """
     doc_whitelist = parse_doc_filter(s.doc_filter)
     flt = build_filter(doc_whitelist)
+    params = build_search_params(s.hnsw_ef)
     limit_candidates = max(s.candidate_k, s.top_k)
 
+    targets = route(s, partitions_for_docs(s, doc_whitelist))
+    if len(targets) == 1:
+        collection, shard_keys = targets[0]
+        candidates = query_candidates(qc, s, collection, query_vec, limit_candidates, flt, params, shard_keys)
+    else:
+        # Mehrere Partition-Collections parallel abfragen (Latenz ≈ langsamste statt Summe)
+        with ThreadPoolExecutor(max_workers=len(targets)) as pool:
+            parts = pool.map(
+                lambda t: query_candidates(qc, s, t[0], query_vec, limit_candidates, flt, params, t[1]),
+                targets,
+            )
+            candidates = [h for part in parts for h in part]
+        candidates.sort(key=lambda h: h.score, reverse=True)
+        candidates = candidates[:limit_candidates]
+
+    # MMR auf Kandidaten
+    reranked = mmr_rerank(query_vec, candidates, s.top_k, s.mmr_lambda)
+    return reranked
+
+
+def query_candidates(
+    qc: QdrantClient,
+    s: Settings,
+    collection: str,
+    query_vec: List[float],
+    limit: int,
+    flt: Filter | None,
+    params: SearchParams | None,
+    shard_keys: List[str] | None = None,
+) -> List[ScoredPoint]:
+    """Kandidatensuche in einer Collection. Handhabt unterschiedliche Client-Signaturen."""
+    extra = {"shard_key_selector": shard_keys} if shard_keys else {}
+
     # 1) Bevorzugt: neue API query_points(...)
     try:
         try:
             # Variante A: query_filter (häufiger in aktuellen Clients)
             resp = qc.query_points(
-                collection_name=s.collection,
+                collection_name=collection,
                 query=query_vec,
-                limit=limit_candidates,
+                limit=limit,
                 with_payload=True,
                 with_vectors=True,            # nötig für MMR
                 query_filter=flt,             # <— WICHTIG: query_filter statt filter
+                search_params=params,
                 score_threshold=s.score_threshold,
+                **extra,
             )
         except (TypeError, AssertionError):
             # Variante B: manche Builds akzeptieren 'filter' statt 'query_filter'
             resp = qc.query_points(
-                collection_name=s.collection,
+                collection_name=collection,
                 query=query_vec,
-                limit=limit_candidates,
+                limit=limit,
                 with_payload=True,
                 with_vectors=True,
                 filter=flt,                   # Fallback
+                search_params=params,
                 score_threshold=s.score_threshold,
+                **extra,
             )
-        candidates = resp.points
+        return resp.points
 
     except AttributeError:
         # 2) Fallback: alte API search(...)
         try:
-            candidates = qc.search(
-                collection_name=s.collection,
+            return qc.search(
+                collection_name=collection,
                 query_vector=query_vec,
-                limit=limit_candidates,
+                limit=limit,
                 with_payload=True,
                 with_vectors=True,
                 query_filter=flt,             # neuere Signatur der alten Methode
+                search_params=params,
                 score_threshold=s.score_threshold,
+                **extra,
             )
         except TypeError:
             # ganz alt: ohne query_filter
-            candidates = qc.search(
-                collection_name=s.collection,
+            return qc.search(
+                collection_name=collection,
                 query_vector=query_vec,
-                limit=limit_candidates,
+                limit=limit,
                 with_payload=True,
                 with_vectors=True,
+                search_params=params,
                 score_threshold=s.score_threshold,
             )
 
-    # 3) MMR auf Kandidaten
-    reranked = mmr_rerank(query_vec, candidates, s.top_k, s.mmr_lambda)
-    return reranked
-
-
 
 def build_context(hits: List[ScoredPoint], max_tokens: int) -> Tuple[str, List[ScoredPoint]]:
     # Formatiere jeden Treffer mit Kopf + Text, trimme auf das Tokenlimit
@@ -153,7 +193,13 @@ def build_context(hits: List[ScoredPoint], max_tokens: int) -> Tuple[str, List[S
     return context, used_hits
 
 
-def chat_once(client: OpenAI, s: Settings, context: str, user_query: str) -> str:
+def chat_once(
+    client: OpenAI,
+    s: Settings,
+    context: str,
+    user_query: str,
+    on_first_token: Callable[[], None] | None = None,
+) -> str:
     system_prompt = build_system_prompt()
     messages = [
         {"role": "system", "content": system_prompt},
@@ -179,6 +225,8 @@ def chat_once(client: OpenAI, s: Settings, context: str, user_query: str) -> str
                 if event.type == "content.delta":
                     chunk = event.delta
                     if chunk:
+                        if on_first_token and not acc:
+                            on_first_token()
                         text = chunk
                         sys.stdout.write(text)
                         sys.stdout.flush()
@@ -196,15 +244,130 @@ def chat_once(client: OpenAI, s: Settings, context: str, user_query: str) -> str
         temperature=0.2,
         max_tokens=s.max_answer_tokens,
     )
+    if on_first_token:
+        on_first_token()  # ohne Streaming: erstes Token = komplette Antwort
     return resp.choices[0].message.content.strip()
 
 
-def main():
-    s = Settings()
+class Warmup:
+    """
+    Baut OpenAI-/Qdrant-Verbindungen und den Tokenizer im Hintergrund auf,
+    während der Nutzer die erste Frage tippt. Jede Stufe wartet nur auf das,
+    was sie selbst braucht.
+    """
+
+    def __init__(self, oa: OpenAI, qc: QdrantClient, s: Settings, warm_openai: bool = True):
+        pool = ThreadPoolExecutor(max_workers=3, thread_name_prefix="warmup")
+        self._futures = {
+            # gRPC-Kanal aufbauen
+            "qdrant": pool.submit(lambda: [qc.collection_exists(c) for c in storage_collections(s)]),
+            # Tokenizer + numpy laden (MMR, Kontext)
+            "local": pool.submit(lambda: (get_encoder(), __import__("numpy"))),
+        }
+        if warm_openai:
+            # billiger GET statt Embedding -> keine Tokenkosten, aber TLS/HTTP-Keepalive steht.
+            # Nur sinnvoll, wenn bis zur ersten Frage Zeit bleibt (interaktiv), nicht bei One-Shot.
+            self._futures["openai"] = pool.submit(oa.models.retrieve, s.embedding_model)
+        pool.shutdown(wait=False)
+
+    def wait(self, name: str) -> None:
+        fut = self._futures.pop(name, None)
+        if fut is None:
+            return
+        try:
+            fut.result()
+        except Exception as e:
+            # Warm-up ist nur Optimierung; echte Fehler zeigt der eigentliche Aufruf
+            print(f"[Warm-up {name}] {e}", file=sys.stderr)
+
+
+def format_timings(t: Dict[str, float]) -> str:
+    labels = [
+        ("embed_ms", "Embedding"),
+        ("search_ms", "Suche+MMR"),
+        ("context_ms", "Kontext"),
+        ("ttft_ms", "TTFT"),
+        ("chat_ms", "Chat"),
+        ("total_ms", "gesamt"),
+    ]
+    parts = [f"{label} {t[key]:.0f} ms" for key, label in labels if key in t]
+    return "[Zeiten] " + " | ".join(parts)
+
+
+def answer_question(
+    oa: OpenAI,
+    qc: QdrantClient,
+    s: Settings,
+    user_query: str,
+    timings: Dict[str, float] | None = None,
+    warm: Warmup | None = None,
+) -> str | None:
+    """
+    Ein kompletter RAG-Durchlauf für eine Frage. Liefert die Antwort inkl. Quellen
+    oder None, wenn keine passenden Treffer gefunden wurden.
+    Mit s.stream wurde die Antwort bereits live ausgegeben; dann kommt nur der
+    Quellenblock zurück (sonst stünde die Antwort doppelt in der Konsole).
+    Optional: timings wird mit Stufenzeiten (ms, inkl. TTFT ab Fragestart) befüllt.
+    """
+    t_start = last = time.perf_counter()
+
+    def mark(key: str) -> None:
+        nonlocal last
+        now = time.perf_counter()
+        if timings is not None:
+            timings[key] = (now - last) * 1000
+        last = now
+
+    def first_token() -> None:
+        if timings is not None:
+            timings["ttft_ms"] = (time.perf_counter() - t_start) * 1000
+
+    # 1) Query einbetten (L2-normalisiert) – parallel zum Qdrant-Warm-up;
+    #    eine noch laufende OpenAI-Vorwärmung abwarten, damit deren Verbindung genutzt wird
+    if warm:
+        warm.wait("openai")
+    qvec = embed_query(oa, s.embedding_model, user_query, s.vector_size)
+    mark("embed_ms")
+
+    # 2) Suche in Qdrant
+    if warm:
+        warm.wait("qdrant")
+        warm.wait("local")
+    hits = search_qdrant(qc, s, qvec)
+    mark("search_ms")
+
+    if not hits:
+        return None
+
+    # 3) Kontext bauen (Token-begrenzt)
+    context, used_hits = build_context(hits, s.max_context_tokens)
+    mark("context_ms")
+
+    # 4) Chat-Antwort generieren (im Streaming-Modus startet der Stream sofort)
+    answer = chat_once(oa, s, context, user_query, on_first_token=first_token)
+    mark("chat_ms")
+    if timings is not None:
+        timings["total_ms"] = (last - t_start) * 1000
+
+    # 5) Quellenhinweis anhängen
+    sources = summarize_sources(used_hits)
+    if s.stream:
+        return "Quellen:\n" + sources if sources else ""
+    if sources:
+        answer += "\n\nQuellen:\n" + sources
+    return answer
+
+
+def main(s: Settings | None = None):
+    s = s or Settings()
+    if s.fast_path:
+        # Latenz-Modus: Antwort immer streamen, damit das erste Token sofort sichtbar ist
+        s = replace(s, stream=True)
 
     # OpenAI + Qdrant
-    oa = OpenAI(api_key=s.openai_api_key)
-    qc = QdrantClient(host=s.qdrant_host, grpc_port=s.qdrant_grpc_port, prefer_grpc=True)
+    oa = get_openai(s)
+    qc = get_qdrant(s)
+    warm = Warmup(oa, qc, s) if s.fast_path else None
 
     print("RAG-Chat gestartet. Tippe deine Frage. Mit 'exit' beenden.\n")
     while True:
@@ -220,28 +383,17 @@ def main():
         if not user_query:
             continue
 
-        # 1) Query einbetten (L2-normalisiert)
-        qvec = embed_query(oa, s.embedding_model, user_query, s.vector_size)
-
-        # 2) Suche in Qdrant
-        hits = search_qdrant(qc, s, qvec)
-
-        if not hits:
+        timings: Dict[str, float] | None = {} if s.fast_path else None
+        answer = answer_question(oa, qc, s, user_query, timings=timings, warm=warm)
+        if answer is None:
             print("Keine passenden Stellen im Material gefunden.")
-            continue
-
-        # 3) Kontext bauen (Token-begrenzt)
-        context, used_hits = build_context(hits, s.max_context_tokens)
+        elif answer:
+            print("\n" + answer + "\n")
 
-        # 4) Chat-Antwort generieren
-        answer = chat_once(oa, s, context, user_query)
-
-        # 5) Quellenhinweis drucken
-        sources = summarize_sources(used_hits)
-        if sources:
-            answer += "\n\nQuellen:\n" + sources
-
-        print("\n" + answer + "\n")
+        if timings:
+            print(format_timings(timings), file=sys.stderr)
+            if s.ttft_target_ms and timings.get("ttft_ms", 0.0) > s.ttft_target_ms:
+                print(f"[Zeiten] TTFT über Ziel ({s.ttft_target_ms} ms)", file=sys.stderr)
 
 def parse_doc_filter(raw: str) -> list[str] | None:
     if not raw:
@@ -253,9 +405,16 @@ def parse_doc_filter(raw: str) -> list[str] | None:
 def build_filter(doc_whitelist: list[str] | None) -> Filter | None:
     if not doc_whitelist:
         return None
-    # OR über mehrere document_id-Werte
-    should = [FieldCondition(key="document_id", match=MatchValue(value=v)) for v in doc_whitelist]
-    return Filter(should=should)
+    from qdrant_client.models import Filter, FieldCondition, MatchAny
+    # Eine Bedingung über alle document_id-Werte (nutzt den Keyword-Index aus Schritt 1)
+    return Filter(must=[FieldCondition(key="document_id", match=MatchAny(any=doc_whitelist))])
+
+def build_search_params(hnsw_ef: int) -> SearchParams | None:
+    # ef > 0 überschreibt die HNSW-Suchbreite; sonst Standard des Servers
+    if hnsw_ef <= 0:
+        return None
+    from qdrant_client.models import SearchParams
+    return SearchParams(hnsw_ef=hnsw_ef)
 
 def mmr_rerank(query_vec: list[float], hits: list[ScoredPoint], k: int, lambda_mult: float) -> list[ScoredPoint]:
     """
@@ -263,6 +422,7 @@ def mmr_rerank(query_vec: list[float], hits: list[ScoredPoint], k: int, lambda_m
       score = λ * sim(query, doc) - (1-λ) * max_sim(doc, already_selected)
     Erwartet, dass die ScoredPoints die gespeicherten Vektoren enthalten (with_vectors=True).
     """
+    import numpy as np
     if not hits:
         return []
     # Hole Dokumentvektoren
@@ -0,0 +1,342 @@
+# step06_tuning.py
+"""
+Retrieval-Autotuner: misst Recall@k, MRR und Latenz (p50/p95) für ein Raster
+aus Retrieval-Parametern gegen den echten Pfad search_qdrant + mmr_rerank und
+gibt die Pareto-optimalen Konfigurationen aus.
+
+Golden Set (JSONL, eine Frage pro Zeile):
+    {"question": "Wie hoch sind die Azure-Kosten?",
+     "expected": [{"document_id": "Azure Kostenkalkulation SmartPlanAI", "page": 2}]}
+'page' ist optional; ein Eintrag darf auch nur der document_id-String sein.
+
+Aufruf:
+    python step06_tuning.py golden.jsonl --top-k 3,5,8 --mmr-lambda 0.3,0.5,0.7 --ef 0,64,128
+"""
+from __future__ import annotations
+import argparse
+import hashlib
+import itertools
+import json
+import os
+import time
+from dataclasses import dataclass, replace, asdict
+from typing import TYPE_CHECKING, Any, Dict, List
+
+from clients import get_openai, get_qdrant
+from config import Settings
+from partitions import storage_collections
+from step05_chatbot import embed_query, search_qdrant
+
+if TYPE_CHECKING:
+    from qdrant_client import QdrantClient
+    from qdrant_client.models import ScoredPoint
+
+# Marker-Dateien für vollständig aufgebaute Tuning-Indizes (unabhängig vom Arbeitsverzeichnis)
+TUNING_MARKER_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), ".rag_tuning")
+
+
+@dataclass
+class GoldenItem:
+    question: str
+    expected: List[Dict[str, Any]]   # [{"document_id": ..., "page": ...?}, ...]
+
+
+@dataclass
+class TuneResult:
+    chunk_tokens: int
+    candidate_k: int
+    top_k: int
+    score_threshold: float
+    mmr_lambda: float
+    hnsw_ef: int
+    recall: float
+    mrr: float
+    p50_ms: float
+    p95_ms: float
+
+
+# ---------- Golden Set & Metriken ----------
+
+def load_golden(path: str) -> List[GoldenItem]:
+    items: List[GoldenItem] = []
+    with open(path, encoding="utf-8") as f:
+        for line_no, line in enumerate(f, start=1):
+            line = line.strip()
+            if not line or line.startswith("#"):
+                continue
+            raw = json.loads(line)
+            expected = [{"document_id": e} if isinstance(e, str) else e for e in raw.get("expected", [])]
+            if not raw.get("question") or not expected:
+                raise SystemExit(f"{path}:{line_no}: 'question' und 'expected' sind Pflicht.")
+            for ref in expected:
+                if not isinstance(ref, dict) or not isinstance(ref.get("document_id"), str) or not ref["document_id"]:
+                    raise SystemExit(f"{path}:{line_no}: jeder 'expected'-Eintrag braucht eine 'document_id'.")
+                if "page" in ref and not isinstance(ref["page"], int):
+                    raise SystemExit(f"{path}:{line_no}: 'page' muss eine Ganzzahl sein.")
+            items.append(GoldenItem(question=raw["question"], expected=expected))
+    if not items:
+        raise SystemExit(f"Golden Set ist leer: {path}")
+    return items
+
+def matches(hit: ScoredPoint, ref: Dict[str, Any]) -> bool:
+    """Treffer passt, wenn Dokument übereinstimmt und (falls angegeben) die Seite im Chunk liegt."""
+    p = hit.payload or {}
+    if p.get("document_id") != ref["document_id"]:
+        return False
+    page = ref.get("page")
+    if page is None:
+        return True
+    return p.get("page_start", 0) <= page <= p.get("page_end", 0)
+
+def recall_at_k(hits: List[ScoredPoint], expected: List[Dict[str, Any]]) -> float:
+    found = sum(1 for ref in expected if any(matches(h, ref) for h in hits))
+    return found / len(expected)
+
+def reciprocal_rank(hits: List[ScoredPoint], expected: List[Dict[str, Any]]) -> float:
+    for rank, h in enumerate(hits, start=1):
+        if any(matches(h, ref) for ref in expected):
+            return 1.0 / rank
+    return 0.0
+
+def percentile(values: List[float], q: float) -> float:
+    """Perzentil mit linearer Interpolation (q in [0, 100])."""
+    if not values:
+        return 0.0
+    vals = sorted(values)
+    pos = (len(vals) - 1) * q / 100.0
+    lo = int(pos)
+    hi = min(lo + 1, len(vals) - 1)
+    return vals[lo] + (vals[hi] - vals[lo]) * (pos - lo)
+
+def pareto_front(results: List[TuneResult]) -> List[TuneResult]:
+    """Nicht dominierte Konfigurationen: Recall und MRR maximieren, p95-Latenz minimieren."""
+    def dominates(a: TuneResult, b: TuneResult) -> bool:
+        no_worse = a.recall >= b.recall and a.mrr >= b.mrr and a.p95_ms <= b.p95_ms
+        better = a.recall > b.recall or a.mrr > b.mrr or a.p95_ms < b.p95_ms
+        return no_worse and better
+    front = [r for r in results if not any(dominates(o, r) for o in results if o is not r)]
+    return sorted(front, key=lambda r: (r.p95_ms, -r.recall, -r.mrr))
+
+
+# ---------- Index je chunk_tokens ----------
+
+def collection_for_chunk_tokens(s: Settings, chunk_tokens: int) -> str:
+    if chunk_tokens == s.chunk_tokens:
+        return s.collection
+    return f"{s.collection}_ct{chunk_tokens}"
+
+def source_fingerprint(s: Settings) -> str:
+    """Fingerprint über PDFs (Pfad, Größe, mtime) und alle Parameter, die den Index bestimmen."""
+    from step02_pdf_chunking import find_pdfs
+    h = hashlib.sha256()
+    for path in find_pdfs(s.pdf_dir):
+        st = os.stat(path)
+        h.update(f"{path}|{st.st_size}|{st.st_mtime_ns}\n".encode("utf-8"))
+    h.update(f"{s.chunk_tokens}|{s.chunk_overlap}|{s.embedding_model}|{s.partition_mode}|{s.partitions}".encode("utf-8"))
+    return h.hexdigest()
+
+def marker_path(name: str) -> str:
+    return os.path.join(TUNING_MARKER_DIR, f"{name}.json")
+
+def index_is_complete(qc: QdrantClient, cfg: Settings, fingerprint: str) -> bool:
+    """Index gilt nur als fertig, wenn Marker, Quellen-Fingerprint und Punktzahl passen."""
+    try:
+        with open(marker_path(cfg.collection), encoding="utf-8") as f:
+            marker = json.load(f)
+    except (FileNotFoundError, ValueError):
+        return False
+    collections = storage_collections(cfg)
+    if marker.get("fingerprint") != fingerprint or not all(qc.collection_exists(c) for c in collections):
+        return False
+    points = sum(qc.count(collection_name=c, exact=True).count for c in collections)
+    return points == marker.get("points")
+
+def ensure_tuning_index(qc: QdrantClient, s: Settings, chunk_tokens: int) -> str:
+    """
+    Der Hauptindex deckt den konfigurierten chunk_tokens-Wert ab. Für andere Werte
+    wird ein eigener Index aufgebaut und per Marker-Datei als vollständig markiert.
+    Abgebrochene Läufe oder geänderte PDFs führen zum Neuaufbau.
+    """
+    name = collection_for_chunk_tokens(s, chunk_tokens)
+    if name == s.collection:
+        return name
+    cfg = replace(s, collection=name, chunk_tokens=chunk_tokens)
+    fingerprint = source_fingerprint(cfg)
+    if index_is_complete(qc, cfg, fingerprint):
+        return name
+
+    from step01_qdrant_setup import ensure_storage
+    from step02_pdf_chunking import build_chunks_for_directory
+    from step03_embeddings import embed_chunks
+    from step04_upsert_qdrant import upsert_partitioned
+
+    print(f"Baue Tuning-Index '{name}' (chunk_tokens={chunk_tokens}) …")
+    if os.path.exists(marker_path(name)):
+        os.remove(marker_path(name))
+    for c in storage_collections(cfg):
+        if qc.collection_exists(c):
+            qc.delete_collection(c)   # unvollständig oder veraltet
+    ensure_storage(qc, cfg)
+    chunks = build_chunks_for_directory(cfg)
+    records = embed_chunks(chunks, model=s.embedding_model, batch_size=96, client=get_openai(s))
+    written = upsert_partitioned(qc, cfg, records, batch_size=256)
+
+    os.makedirs(TUNING_MARKER_DIR, exist_ok=True)
+    with open(marker_path(name), "w", encoding="utf-8") as f:
+        json.dump({"fingerprint": fingerprint, "points": written}, f)
+    return name
+
+
+# ---------- Sweep ----------
+
+def evaluate(
+    qc: QdrantClient,
+    cfg: Settings,
+    golden: List[GoldenItem],
+    query_vecs: List[List[float]],
+    repeat: int,
+) -> TuneResult:
+    search_qdrant(qc, cfg, query_vecs[0])  # Warm-up (Verbindung, Caches)
+
+    latencies: List[float] = []
+    recalls: List[float] = []
+    rrs: List[float] = []
+    for item, qvec in zip(golden, query_vecs):
+        for _ in range(repeat):
+            t0 = time.perf_counter()
+            hits = search_qdrant(qc, cfg, qvec)
+            latencies.append((time.perf_counter() - t0) * 1000)
+        recalls.append(recall_at_k(hits, item.expected))
+        rrs.append(reciprocal_rank(hits, item.expected))
+
+    return TuneResult(
+        chunk_tokens=cfg.chunk_tokens,
+        candidate_k=cfg.candidate_k,
+        top_k=cfg.top_k,
+        score_threshold=cfg.score_threshold,
+        mmr_lambda=cfg.mmr_lambda,
+        hnsw_ef=cfg.hnsw_ef,
+        recall=sum(recalls) / len(recalls),
+        mrr=sum(rrs) / len(rrs),
+        p50_ms=percentile(latencies, 50),
+        p95_ms=percentile(latencies, 95),
+    )
+
+def search_combos(grid: Dict[str, list]) -> List[tuple]:
+    """
+    Kombinationen ohne chunk_tokens. search_qdrant sucht mit max(candidate_k, top_k),
+    daher wird candidate_k entsprechend angehoben und Doppelte entfallen.
+    """
+    combos: Dict[tuple, None] = {}
+    for candidate_k, top_k, threshold, lam, ef in itertools.product(
+        grid["candidate_k"], grid["top_k"], grid["score_threshold"], grid["mmr_lambda"], grid["hnsw_ef"],
+    ):
+        combos[(max(candidate_k, top_k), top_k, threshold, lam, ef)] = None
+    return list(combos)
+
+def sweep(s: Settings, golden: List[GoldenItem], grid: Dict[str, list], repeat: int) -> List[TuneResult]:
+    oa = get_openai(s)
+    qc = get_qdrant(s)
+
+    # Query-Embeddings hängen nicht von den Suchparametern ab -> einmal erzeugen
+    query_vecs = [embed_query(oa, s.embedding_model, g.question, s.vector_size) for g in golden]
+
+    results: List[TuneResult] = []
+    for chunk_tokens in grid["chunk_tokens"]:
+        collection = ensure_tuning_index(qc, s, chunk_tokens)
+        for candidate_k, top_k, threshold, lam, ef in search_combos(grid):
+            cfg = replace(
+                s,
+                collection=collection,
+                chunk_tokens=chunk_tokens,
+                candidate_k=candidate_k,
+                top_k=top_k,
+                score_threshold=threshold,
+                mmr_lambda=lam,
+                hnsw_ef=ef,
+            )
+            r = evaluate(qc, cfg, golden, query_vecs, repeat)
+            results.append(r)
+            print(f"  {format_result(r)}")
+    return results
+
+def format_result(r: TuneResult) -> str:
+    return (f"ct={r.chunk_tokens:<4} cand={r.candidate_k:<3} k={r.top_k:<2} thr={r.score_threshold:<5.2f} "
+            f"λ={r.mmr_lambda:<4.2f} ef={r.hnsw_ef:<4} | recall={r.recall:.3f} mrr={r.mrr:.3f} "
+            f"p50={r.p50_ms:6.1f}ms p95={r.p95_ms:6.1f}ms")
+
+
+# ---------- CLI ----------
+
+def parse_list(raw: str | None, cast, default, option: str) -> list:
+    if not raw:
+        return [default]
+    try:
+        return [cast(x.strip()) for x in raw.split(",") if x.strip()]
+    except ValueError:
+        raise SystemExit(f"{option}: ungültiger Wert in '{raw}'.")
+
+def validate_grid(s: Settings, grid: Dict[str, list]) -> None:
+    """Unsinnige Werte früh abweisen – insbesondere, bevor teure Embeddings entstehen."""
+    for v in grid["chunk_tokens"]:
+        if v <= s.chunk_overlap:
+            raise SystemExit(
+                f"--chunk-tokens: {v} muss größer als RAG_CHUNK_OVERLAP ({s.chunk_overlap}) sein "
+                f"(sonst entsteht fast ein Chunk pro Token)."
+            )
+    for option, key in (("--candidate-k", "candidate_k"), ("--top-k", "top_k")):
+        bad = [v for v in grid[key] if v <= 0]
+        if bad:
+            raise SystemExit(f"{option}: Werte müssen > 0 sein (erhalten: {bad}).")
+    bad = [v for v in grid["mmr_lambda"] if not 0.0 <= v <= 1.0]
+    if bad:
+        raise SystemExit(f"--mmr-lambda: Werte müssen in [0, 1] liegen (erhalten: {bad}).")
+    bad = [v for v in grid["hnsw_ef"] if v < 0]
+    if bad:
+        raise SystemExit(f"--ef: Werte müssen >= 0 sein (erhalten: {bad}).")
+
+def build_parser() -> argparse.ArgumentParser:
+    p = argparse.ArgumentParser(description="Retrieval-Parameter gegen ein Golden Set abstimmen.")
+    p.add_argument("golden", help="Golden Set (JSONL)")
+    p.add_argument("--chunk-tokens", help="z. B. 300,500 (weitere Werte bauen eigene Collections)")
+    p.add_argument("--candidate-k", help="z. B. 10,20,40")
+    p.add_argument("--top-k", help="z. B. 3,5,8")
+    p.add_argument("--score-threshold", help="z. B. 0.2,0.25,0.35")
+    p.add_argument("--mmr-lambda", help="z. B. 0.3,0.5,0.7")
+    p.add_argument("--ef", help="HNSW ef, z. B. 0,64,128 (0 = Server-Standard)")
+    p.add_argument("--repeat", type=int, default=3, help="Suchläufe pro Frage für die Latenzmessung (Standard: 3)")
+    p.add_argument("--out", help="Alle Ergebnisse + Pareto-Front als JSON speichern")
+    return p
+
+def main(argv: list[str] | None = None) -> None:
+    args = build_parser().parse_args(argv)
+    s = Settings()
+    golden = load_golden(args.golden)
+
+    grid = {
+        "chunk_tokens": parse_list(args.chunk_tokens, int, s.chunk_tokens, "--chunk-tokens"),
+        "candidate_k": parse_list(args.candidate_k, int, s.candidate_k, "--candidate-k"),
+        "top_k": parse_list(args.top_k, int, s.top_k, "--top-k"),
+        "score_threshold": parse_list(args.score_threshold, float, s.score_threshold, "--score-threshold"),
+        "mmr_lambda": parse_list(args.mmr_lambda, float, s.mmr_lambda, "--mmr-lambda"),
+        "hnsw_ef": parse_list(args.ef, int, s.hnsw_ef, "--ef"),
+    }
+    validate_grid(s, grid)
+    n = len(grid["chunk_tokens"]) * len(search_combos(grid))
+    print(f"Tuning: {len(golden)} Fragen × {n} Konfigurationen")
+
+    results = sweep(s, golden, grid, max(1, args.repeat))
+    front = pareto_front(results)
+
+    print("\nPareto-optimale Konfigurationen (nach p95 sortiert):")
+    for r in front:
+        print(f"  {format_result(r)}")
+
+    if args.out:
+        with open(args.out, "w", encoding="utf-8") as f:
+            json.dump({"results": [asdict(r) for r in results], "pareto": [asdict(r) for r in front]},
+                      f, ensure_ascii=False, indent=2)
+        print(f"\nErgebnisse gespeichert: {args.out}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,175 @@
+# stub_openai_server.py
+"""
+Minimaler OpenAI-kompatibler Stub-Server mit einstellbarer Latenz, um den
+Latenz-Modus (TTFT, Stufenzeiten) ohne echte API-Aufrufe zu prüfen.
+
+    python stub_openai_server.py --port 8099 --embed-ms 80 --first-token-ms 300 --token-ms 20
+
+Danach (zweites Terminal, echte Qdrant-Instanz):
+    OPENAI_BASE_URL=http://127.0.0.1:8099/v1 OPENAI_API_KEY=stub RAG_SCORE_THRESHOLD=-1 \\
+        python rag_cli.py ask --fast --max-ttft-ms 600 "Testfrage"
+
+Die Stub-Embeddings sind deterministische Zufallsvektoren (pro Text) – ohne
+RAG_SCORE_THRESHOLD=-1 findet die Suche im echten Index meist nichts.
+Implementiert: GET /v1/models/<id>, POST /v1/embeddings, POST /v1/chat/completions (auch stream=true).
+"""
+from __future__ import annotations
+import argparse
+import base64
+import hashlib
+import json
+import random
+import struct
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+STUB_ANSWER = "Dies ist eine Stub-Antwort aus dem Testserver. Sie enthält keine echten Informationen."
+
+
+def stub_vector(text: str, dim: int) -> list[float]:
+    """Deterministischer, L2-normalisierter Zufallsvektor pro Text."""
+    seed = int.from_bytes(hashlib.sha256(text.encode("utf-8")).digest()[:8], "big")
+    rnd = random.Random(seed)
+    v = [rnd.gauss(0.0, 1.0) for _ in range(dim)]
+    n = sum(x * x for x in v) ** 0.5 or 1.0
+    return [x / n for x in v]
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    # werden in main() gesetzt
+    embed_s = 0.0
+    first_token_s = 0.0
+    token_s = 0.0
+    dim = 3072
+    protocol_version = "HTTP/1.1"   # Keep-Alive, damit Warm-up wirkt
+
+    def log_message(self, fmt, *args):  # leiser als der Standard
+        pass
+
+    def _send_json(self, obj: dict, status: int = 200) -> None:
+        body = json.dumps(obj).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _read_json(self) -> dict:
+        length = int(self.headers.get("Content-Length", "0"))
+        return json.loads(self.rfile.read(length) or b"{}")
+
+    def do_GET(self):
+        if self.path.startswith("/v1/models/"):
+            model = self.path.rsplit("/", 1)[-1]
+            self._send_json({"id": model, "object": "model", "created": 0, "owned_by": "stub"})
+        else:
+            self._send_json({"error": {"message": f"unbekannter Pfad {self.path}"}}, 404)
+
+    def do_POST(self):
+        req = self._read_json()
+        if self.path == "/v1/embeddings":
+            self._embeddings(req)
+        elif self.path == "/v1/chat/completions":
+            self._chat(req)
+        else:
+            self._send_json({"error": {"message": f"unbekannter Pfad {self.path}"}}, 404)
+
+    def _embeddings(self, req: dict) -> None:
+        time.sleep(self.embed_s)
+        inputs = req.get("input", [])
+        if isinstance(inputs, str):
+            inputs = [inputs]
+        data = []
+        for i, text in enumerate(inputs):
+            vec = stub_vector(str(text), self.dim)
+            if req.get("encoding_format") == "base64":
+                # das SDK fordert standardmäßig base64 (float32, little endian) an
+                emb = base64.b64encode(struct.pack(f"<{len(vec)}f", *vec)).decode("ascii")
+            else:
+                emb = vec
+            data.append({"object": "embedding", "index": i, "embedding": emb})
+        self._send_json({
+            "object": "list",
+            "data": data,
+            "model": req.get("model", "stub"),
+            "usage": {"prompt_tokens": 0, "total_tokens": 0},
+        })
+
+    def _chat(self, req: dict) -> None:
+        model = req.get("model", "stub")
+        created = int(time.time())
+        words = STUB_ANSWER.split(" ")
+
+        if not req.get("stream"):
+            time.sleep(self.first_token_s + self.token_s * len(words))
+            self._send_json({
+                "id": "chatcmpl-stub",
+                "object": "chat.completion",
+                "created": created,
+                "model": model,
+                "choices": [{
+                    "index": 0,
+                    "message": {"role": "assistant", "content": STUB_ANSWER},
+                    "finish_reason": "stop",
+                }],
+                "usage": {"prompt_tokens": 0, "completion_tokens": len(words), "total_tokens": len(words)},
+            })
+            return
+
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Cache-Control", "no-cache")
+        self.send_header("Transfer-Encoding", "chunked")
+        self.end_headers()
+
+        def write_chunk(data: bytes) -> None:
+            self.wfile.write(f"{len(data):x}\r\n".encode("ascii") + data + b"\r\n")
+            self.wfile.flush()
+
+        def event(delta: dict, finish: str | None = None) -> None:
+            chunk = {
+                "id": "chatcmpl-stub",
+                "object": "chat.completion.chunk",
+                "created": created,
+                "model": model,
+                "choices": [{"index": 0, "delta": delta, "finish_reason": finish}],
+            }
+            write_chunk(f"data: {json.dumps(chunk)}\n\n".encode("utf-8"))
+
+        time.sleep(self.first_token_s)
+        event({"role": "assistant", "content": ""})
+        for i, word in enumerate(words):
+            if i:
+                time.sleep(self.token_s)
+            event({"content": word if i == 0 else " " + word})
+        event({}, finish="stop")
+        write_chunk(b"data: [DONE]\n\n")
+        write_chunk(b"")  # Ende der chunked-Übertragung
+
+
+def main(argv: list[str] | None = None) -> None:
+    p = argparse.ArgumentParser(description="OpenAI-kompatibler Stub mit injizierter Latenz.")
+    p.add_argument("--host", default="127.0.0.1")
+    p.add_argument("--port", type=int, default=8099)
+    p.add_argument("--embed-ms", type=float, default=50.0, help="Latenz je Embedding-Request")
+    p.add_argument("--first-token-ms", type=float, default=300.0, help="Latenz bis zum ersten Chat-Token")
+    p.add_argument("--token-ms", type=float, default=20.0, help="Abstand zwischen weiteren Tokens")
+    p.add_argument("--dim", type=int, default=3072, help="Embedding-Dimension")
+    args = p.parse_args(argv)
+
+    StubHandler.embed_s = args.embed_ms / 1000
+    StubHandler.first_token_s = args.first_token_ms / 1000
+    StubHandler.token_s = args.token_ms / 1000
+    StubHandler.dim = args.dim
+
+    server = ThreadingHTTPServer((args.host, args.port), StubHandler)
+    print(f"Stub-Server auf http://{args.host}:{args.port}/v1 "
+          f"(Embedding {args.embed_ms:.0f} ms, erstes Token {args.first_token_ms:.0f} ms)")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        print("\nStub-Server beendet.")
+
+
+if __name__ == "__main__":
+    main()